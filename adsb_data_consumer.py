@@ -4,26 +4,18 @@ Date: September 26, 2023
 """
 
 import pika
-import csv
-import configparser
-
-# Load the configuration parameters from a file
-config = configparser.ConfigParser()
-config.read('config.ini')
-
-# Get the configuration parameters
-rabbit_host = config['RabbitMQ']['rabbit_host']
-rabbit_port = int(config['RabbitMQ']['rabbit_port'])
+from csv_sink import sink_from_config
+from consumer_common import config, rabbit_host, rabbit_port, decode_message
 
 #Queue name
 queue_name = 'adsb_data_queue'
 
-# CSV file configuration
-csv_filename = 'adsb_data_messages.csv'
-
 # CSV headers
 csv_headers = ['type_msg', 'aircraft_icao_id', 'first_date', 'first_timestamp', 'altitude', 'latitude', 'longitude']
 
+# Rotating CSV output (see csv_sink.py)
+csv_sink = sink_from_config(config, 'adsb_data_messages', csv_headers)
+
 def adsb_data_callback(ch, method, properties, body):
     """
     Callback function for handling ADS-B data messages received from RabbitMQ.
@@ -38,13 +30,10 @@ def adsb_data_callback(ch, method, properties, body):
         None.
     """    
     try:
-        # Decode the message from bytes to a string
-        body_str = body.decode('utf-8')
-        # Check if the message is a heartbeat message
-        if body_str == "Heartbeat Message":
-            # Ignore heartbeat messages
+        fields = decode_message(body)
+        # Ignore heartbeat messages
+        if fields is None:
             return
-        fields = body_str.split(',')
         
 
         # Extract relevant information
@@ -56,22 +45,8 @@ def adsb_data_callback(ch, method, properties, body):
         latitude = fields[5]
         longitude = fields[6]
 
-        # Check if the CSV file exists, and create it with headers if not
-        csv_exists = False
-        try:
-            with open(csv_filename, 'r') as csv_file:
-                csv_exists = True
-        except FileNotFoundError:
-            pass
-
-        with open(csv_filename, mode='a', newline='') as csv_file:
-            csv_writer = csv.writer(csv_file)
-
-            # Write headers if the file is newly created
-            if not csv_exists:
-                csv_writer.writerow(csv_headers)
-
-            csv_writer.writerow([type_msg, aircraft_icao_id, first_date, first_timestamp, altitude, latitude, longitude])
+        # Append the message to the current output segment
+        csv_sink.write_row([type_msg, aircraft_icao_id, first_date, first_timestamp, altitude, latitude, longitude])
 
         print(f"Received ADS-B data (altitude, latitude, longitude) for aircraft ICAO ID: {aircraft_icao_id} / {altitude} / {latitude} / {longitude}")
 
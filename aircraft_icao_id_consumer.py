@@ -3,25 +3,17 @@ Author: Pasquale Salomone
 Date: September 26, 2023
 '''
 import pika
-import csv
-import configparser
-
-# Load the configuration parameters from a file
-config = configparser.ConfigParser()
-config.read('config.ini')
-
-# Get the configuration parameters
-rabbit_host = config['RabbitMQ']['rabbit_host']
-rabbit_port = int(config['RabbitMQ']['rabbit_port'])
+from csv_sink import sink_from_config
+from consumer_common import config, rabbit_host, rabbit_port, decode_message
 
 #Queue name
 queue_name = 'aircraft_icao_id_queue'
-# CSV file configuration
-csv_filename = 'aircraft_icao_id_messages.csv'
-
 # CSV headers
 csv_headers = ['type_msg', 'aircraft_icao_id', 'first_date', 'first_timestamp', 'company_id']
 
+# Rotating CSV output (see csv_sink.py)
+csv_sink = sink_from_config(config, 'aircraft_icao_id_messages', csv_headers)
+
 # Create a set to store unique message keys (aircraft_icao_id + company_id)
 unique_message_keys = set()
 # Create a set to store unique company IDs
@@ -41,13 +33,10 @@ def aircraft_icao_id_callback(ch, method, properties, body):
         None.
     """    
     try:
-        # Decode the message from bytes to a string
-        body_str = body.decode('utf-8')
-        # Check if the message is a heartbeat message
-        if body_str == "Heartbeat Message":
-            # Ignore heartbeat messages
+        fields = decode_message(body)
+        # Ignore heartbeat messages
+        if fields is None:
             return
-        fields = body_str.split(',')
 
         # Extract relevant information
         type_msg = fields[0]
@@ -74,22 +63,8 @@ def aircraft_icao_id_callback(ch, method, properties, body):
 
                 print(f"Count of Unique Company IDs: {len(unique_company_ids)}")
 
-            # Check if the CSV file exists, and create it with headers if not
-            csv_exists = False
-            try:
-                with open(csv_filename, 'r') as csv_file:
-                    csv_exists = True
-            except FileNotFoundError:
-                pass
-
-            with open(csv_filename, mode='a', newline='') as csv_file:
-                csv_writer = csv.writer(csv_file)
-
-                # Write headers if the file is newly created
-                if not csv_exists:
-                    csv_writer.writerow(csv_headers)
-
-                csv_writer.writerow([type_msg, aircraft_icao_id, first_date, first_timestamp, company_id])
+            # Append the message to the current output segment
+            csv_sink.write_row([type_msg, aircraft_icao_id, first_date, first_timestamp, company_id])
 
             #print(f"Received ADSB data (company id) for aircraft ICAO ID: {aircraft_icao_id} / {company_id}")
 
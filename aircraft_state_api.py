@@ -0,0 +1,305 @@
+'''
+Date: October 19, 2026
+
+Keeps the latest known state of every aircraft (position, velocity, squawk and company)
+in memory and serves it over a small HTTP/JSON API.
+
+Endpoints:
+    GET /aircraft                 List every aircraft. Optional filters: company, squawk,
+                                  min_altitude, max_altitude.
+    GET /aircraft/<icao>          Latest state of a single aircraft.
+    GET /health                   Number of tracked aircraft and age of the snapshot.
+
+Requests are answered from a snapshot that is rebuilt in the background, so serving a
+query never takes the lock that message processing uses to update the table.
+'''
+import json
+import time
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qs
+
+# How often (seconds) the served snapshot is rebuilt from the live table
+SNAPSHOT_INTERVAL = 1.0
+
+# Aircraft not heard from for this many seconds are dropped from the table
+STALE_AFTER = 300
+
+# Maximum number of distinct filtered list responses cached per snapshot
+QUERY_CACHE_SIZE = 256
+
+# Default port; 8080 is left free for PiAware's SkyAware web interface
+DEFAULT_PORT = 8754
+
+# Query string filters accepted by GET /aircraft
+LIST_FILTERS = ('company', 'squawk', 'min_altitude', 'max_altitude')
+
+logger = logging.getLogger(__name__)
+
+
+def _to_number(value):
+    """
+    Converts a CSV field to an int or float, returning None for empty or malformed values.
+    """
+    value = value.strip()
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+
+
+def _to_json(payload):
+    return json.dumps(payload, separators=(',', ':')).encode('utf-8')
+
+
+class AircraftSnapshot:
+    """
+    Immutable view of the aircraft table with its JSON responses computed up front.
+
+    Args:
+        records (dict): Aircraft ICAO ID -> state dictionary.
+        version (int): Table version the snapshot was built from.
+    """
+
+    def __init__(self, records, version):
+        self.records = records
+        self.version = version
+        self.generated_at = time.time()
+        self.aircraft_json = {icao: _to_json(state) for icao, state in records.items()}
+        self.list_json = _to_json({'count': len(records), 'aircraft': list(records.values())})
+        self._query_cache = {}
+
+    def query(self, company=None, squawk=None, min_altitude=None, max_altitude=None):
+        """
+        Returns the JSON list response for the given filters, caching it for the lifetime
+        of the snapshot.
+        """
+        key = (company, squawk, min_altitude, max_altitude)
+        if key == (None, None, None, None):
+            return self.list_json
+
+        body = self._query_cache.get(key)
+        if body is not None:
+            return body
+
+        matches = []
+        for state in self.records.values():
+            if company is not None and state.get('company_id') != company:
+                continue
+            if squawk is not None and state.get('squawk') != squawk:
+                continue
+            altitude = state.get('altitude')
+            if min_altitude is not None and (altitude is None or altitude < min_altitude):
+                continue
+            if max_altitude is not None and (altitude is None or altitude > max_altitude):
+                continue
+            matches.append(state)
+
+        body = _to_json({'count': len(matches), 'aircraft': matches})
+        if len(self._query_cache) < QUERY_CACHE_SIZE:
+            self._query_cache[key] = body
+        return body
+
+
+class AircraftStateTable:
+    """
+    Thread-safe table holding the latest known state of each aircraft, keyed by ICAO ID.
+
+    `update()` is called from the message processing path and only touches a dictionary
+    under a short lock. Readers use `snapshot`, which is replaced wholesale by
+    `build_snapshot()`.
+    """
+
+    def __init__(self, stale_after=STALE_AFTER):
+        self.stale_after = stale_after
+        self._aircraft = {}
+        self._lock = threading.Lock()
+        self._version = 0
+        self.snapshot = AircraftSnapshot({}, 0)
+
+    def update(self, fields):
+        """
+        Merges one decoded message into the table.
+
+        Args:
+            fields (list): Message fields as produced by `extract_info()` in
+                           flight_data_producer.py (type_msg, aircraft_icao_id, first_date,
+                           first_timestamp, followed by the type specific values).
+        """
+        if len(fields) < 5:
+            return
+
+        type_msg, aircraft_icao_id, first_date, first_timestamp = fields[:4]
+
+        if type_msg == 'MSG3' and len(fields) >= 7:
+            changes = {'altitude': _to_number(fields[4]),
+                       'latitude': _to_number(fields[5]),
+                       'longitude': _to_number(fields[6])}
+        elif type_msg == 'MSG4' and len(fields) >= 6:
+            changes = {'speed': _to_number(fields[4]),
+                       'heading': _to_number(fields[5])}
+        elif type_msg == 'MSG6':
+            changes = {'squawk': fields[4].strip()}
+        elif type_msg == 'MSG1':
+            # Stored upper-case to match the case-insensitive company filter
+            changes = {'company_id': fields[4].strip().upper()}
+        else:
+            return
+
+        with self._lock:
+            state = self._aircraft.get(aircraft_icao_id)
+            if state is None:
+                state = self._aircraft[aircraft_icao_id] = {'aircraft_icao_id': aircraft_icao_id}
+            state.update(changes)
+            state['last_seen'] = f"{first_date} {first_timestamp}"
+            state['updated_at'] = time.time()
+            self._version += 1
+
+    def __len__(self):
+        return len(self._aircraft)
+
+    def build_snapshot(self):
+        """
+        Rebuilds the served snapshot if the table changed since the last one, dropping
+        aircraft that have gone stale.
+
+        Returns:
+            AircraftSnapshot: The current snapshot.
+        """
+        cutoff = time.time() - self.stale_after
+        with self._lock:
+            stale = [icao for icao, state in self._aircraft.items() if state['updated_at'] < cutoff]
+            for icao in stale:
+                del self._aircraft[icao]
+            if stale:
+                self._version += 1
+            if self._version == self.snapshot.version:
+                return self.snapshot
+            version = self._version
+            records = {icao: dict(state) for icao, state in self._aircraft.items()}
+
+        # Serialising happens outside the lock so updates are never held up by it
+        self.snapshot = AircraftSnapshot(records, version)
+        return self.snapshot
+
+
+class AircraftStateHandler(BaseHTTPRequestHandler):
+    """
+    Serves the aircraft table of the owning `AircraftStateServer`.
+    """
+
+    # Keep-alive lets benchmark and dashboard clients reuse their connections
+    protocol_version = 'HTTP/1.1'
+    # Headers and body go out in separate writes; without this each response waits on
+    # the client's delayed ACK
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        snapshot = self.server.table.snapshot
+        url = urlsplit(self.path)
+        path = url.path.rstrip('/')
+
+        if path == '/aircraft':
+            try:
+                filters = self._parse_filters(url.query)
+            except ValueError as e:
+                self._send_json(400, _to_json({'error': str(e)}))
+                return
+            self._send_json(200, snapshot.query(**filters))
+
+        elif path.startswith('/aircraft/'):
+            aircraft_icao_id = path[len('/aircraft/'):].upper()
+            body = snapshot.aircraft_json.get(aircraft_icao_id)
+            if body is None:
+                self._send_json(404, _to_json({'error': f"Unknown aircraft ICAO ID: {aircraft_icao_id}"}))
+            else:
+                self._send_json(200, body)
+
+        elif path == '/health':
+            self._send_json(200, _to_json({'aircraft': len(snapshot.records),
+                                           'snapshot_age': round(time.time() - snapshot.generated_at, 3)}))
+
+        else:
+            self._send_json(404, _to_json({'error': f"Unknown path: {url.path}"}))
+
+    @staticmethod
+    def _parse_filters(query):
+        filters = {}
+        for name, values in parse_qs(query).items():
+            if name not in LIST_FILTERS:
+                raise ValueError(f"Unknown filter: {name}")
+            value = values[-1]
+            if name in ('min_altitude', 'max_altitude'):
+                number = _to_number(value)
+                if number is None:
+                    raise ValueError(f"{name} must be a number")
+                filters[name] = number
+            elif name == 'company':
+                filters[name] = value.upper()
+            else:
+                filters[name] = value
+        return filters
+
+    def _send_json(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Per request logging would dominate the cost of serving a snapshot
+        pass
+
+
+class AircraftStateServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, server_address, table):
+        super().__init__(server_address, AircraftStateHandler)
+        self.table = table
+
+
+def refresh_snapshots(table, interval=SNAPSHOT_INTERVAL):
+    """
+    Rebuilds the table snapshot every `interval` seconds. Runs forever in a daemon thread.
+    """
+    while True:
+        time.sleep(interval)
+        try:
+            table.build_snapshot()
+        except Exception as e:
+            logger.error(f"Error building aircraft snapshot: {str(e)}")
+
+
+def start_state_api(table, host='127.0.0.1', port=DEFAULT_PORT, interval=SNAPSHOT_INTERVAL):
+    """
+    Starts the HTTP/JSON API and the snapshot refresher on daemon threads.
+
+    Args:
+        table (AircraftStateTable): The table to serve.
+        host (str): Address to bind the HTTP server to.
+        port (int): Port to bind the HTTP server to.
+        interval (float): Seconds between snapshot rebuilds.
+
+    Returns:
+        AircraftStateServer: The running server; call `shutdown()` to stop it.
+    """
+    server = AircraftStateServer((host, port), table)
+
+    snapshot_thread = threading.Thread(target=refresh_snapshots, args=(table, interval))
+    snapshot_thread.daemon = True
+    snapshot_thread.start()
+
+    server_thread = threading.Thread(target=server.serve_forever)
+    server_thread.daemon = True
+    server_thread.start()
+
+    logger.info(f"Aircraft state API listening on http://{host}:{server.server_address[1]}")
+    return server
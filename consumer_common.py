@@ -0,0 +1,86 @@
+'''
+Date: October 19, 2026
+
+Configuration, message decoding and the dedicated-connection consume loop shared by the
+consumers. Importing it from several consumers in one process (see consumer_host.py) reads
+config.ini only once.
+'''
+import time
+import threading
+import configparser
+import pika
+
+# Load the configuration parameters from a file
+config = configparser.ConfigParser()
+config.read('config.ini')
+
+# Get the configuration parameters
+rabbit_host = config['RabbitMQ']['rabbit_host']
+rabbit_port = int(config['RabbitMQ']['rabbit_port'])
+
+HEARTBEAT_MESSAGE = "Heartbeat Message"
+
+# Seconds to wait before reconnecting a dedicated consumer, doubled after every failed
+# attempt up to RECONNECT_MAX_DELAY
+RECONNECT_DELAY = 1
+RECONNECT_MAX_DELAY = 60
+
+
+def decode_message(body):
+    """
+    Decodes a message body published by flight_data_producer.py into its fields.
+
+    Args:
+        body (bytes): The message body as bytes.
+
+    Returns:
+        list: The comma separated fields of the message, or None for heartbeat messages.
+    """
+    # Decode the message from bytes to a string
+    body_str = body.decode('utf-8')
+    # Heartbeat messages only tell the broker the producer is alive
+    if body_str == HEARTBEAT_MESSAGE:
+        return None
+    return body_str.split(',')
+
+
+def consume_with_reconnect(queue_name, on_message):
+    """
+    Consumes one queue on a connection of its own, forever. A lost connection or any other
+    failure is logged and the queue is consumed again on a new connection, with a growing
+    delay between attempts.
+
+    Args:
+        queue_name (str): The queue to consume.
+        on_message: pika callback for each delivery.
+    """
+    delay = RECONNECT_DELAY
+    while True:
+        connection = None
+        try:
+            connection = pika.BlockingConnection(pika.ConnectionParameters(host=rabbit_host, port=rabbit_port, heartbeat=600))
+            channel = connection.channel()
+            channel.queue_declare(queue=queue_name, durable=True)
+            channel.basic_consume(queue=queue_name, on_message_callback=on_message, auto_ack=True)
+            delay = RECONNECT_DELAY
+            channel.start_consuming()
+        except Exception as e:
+            print(f"Error consuming {queue_name}: {str(e)}. Reconnecting in {delay}s")
+        finally:
+            if connection is not None and connection.is_open:
+                try:
+                    connection.close()
+                except Exception:
+                    pass
+        time.sleep(delay)
+        delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+
+def start_dedicated_consumer(queue_name, on_message):
+    """
+    Runs `consume_with_reconnect` for one queue in a daemon thread and returns the thread.
+    """
+    consumer_thread = threading.Thread(target=consume_with_reconnect, args=(queue_name, on_message))
+    consumer_thread.daemon = True
+    consumer_thread.start()
+    return consumer_thread
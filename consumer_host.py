@@ -0,0 +1,137 @@
+'''
+Date: October 19, 2026
+
+Runs any subset of the consumers in a single process on one RabbitMQ connection, with one
+channel per queue, instead of one process and connection per consumer. Configuration,
+message decoding and the CSV output infrastructure are shared between the handlers.
+
+Usage:
+    python consumer_host.py [handler ...]
+
+Handlers are the names in HANDLERS; those in DEDICATED_CONNECTION_HANDLERS (the emergency
+fast path) get a connection of their own, which is reopened if it drops. Without arguments
+the comma separated `Handlers` key of the optional [ConsumerHost] section in config.ini is
+used, or all handlers if it is missing. Per-handler throughput is printed every
+REPORT_INTERVAL seconds.
+'''
+import sys
+import time
+import importlib
+import pika
+from consumer_common import config, rabbit_host, rabbit_port, start_dedicated_consumer
+
+# Handler name -> (module, queue name attribute, callback function)
+HANDLERS = {
+    'adsb': ('adsb_data_consumer', 'queue_name', 'adsb_data_callback'),
+    'nav': ('nav_data_consumer', 'queue_name', 'nav_data_callback'),
+    'aircraft_icao_id': ('aircraft_icao_id_consumer', 'queue_name', 'aircraft_icao_id_callback'),
+    'transponder': ('transponder_consumer', 'transponder_queue', 'transponder_callback'),
+    'emergency': ('transponder_consumer', 'emergency_queue', 'emergency_callback'),
+}
+
+# Handlers consumed on a connection and thread of their own, so their deliveries never wait
+# behind a backlog on the shared connection
+DEDICATED_CONNECTION_HANDLERS = ('emergency',)
+
+# Seconds between throughput reports
+REPORT_INTERVAL = 30
+
+
+class HandlerStats:
+    """
+    Message count and time spent in one handler's callback.
+    """
+
+    def __init__(self, name, queue_name):
+        self.name = name
+        self.queue_name = queue_name
+        self.messages = 0
+        self.busy_seconds = 0.0
+        self._reported_messages = 0
+
+    def wrap(self, callback):
+        """
+        Returns a pika callback that runs `callback` and records its cost.
+        """
+        def on_message(ch, method, properties, body):
+            started = time.perf_counter()
+            try:
+                callback(ch, method, properties, body)
+            finally:
+                self.messages += 1
+                self.busy_seconds += time.perf_counter() - started
+        return on_message
+
+    def report(self, elapsed):
+        """
+        Returns a one line throughput summary for the last `elapsed` seconds.
+        """
+        new_messages = self.messages - self._reported_messages
+        self._reported_messages = self.messages
+        per_message = self.busy_seconds / self.messages * 1000 if self.messages else 0.0
+        return (f"{self.name} ({self.queue_name}): {new_messages / elapsed:.1f} msg/s, "
+                f"{self.messages} total, {per_message:.2f} ms/msg")
+
+
+def load_handler(name):
+    """
+    Imports a handler module and returns its queue name and callback.
+
+    Args:
+        name (str): A key of HANDLERS.
+
+    Returns:
+        tuple: (queue_name, callback)
+    """
+    if name not in HANDLERS:
+        raise ValueError(f"Unknown handler: {name}. Available handlers: {', '.join(HANDLERS)}")
+    module_name, queue_attribute, callback_name = HANDLERS[name]
+    module = importlib.import_module(module_name)
+    return getattr(module, queue_attribute), getattr(module, callback_name)
+
+
+def selected_handlers(argv):
+    if argv:
+        return argv
+    names = config.get('ConsumerHost', 'Handlers', fallback=','.join(HANDLERS))
+    return [name.strip() for name in names.split(',') if name.strip()]
+
+
+def main(handler_names):
+    handlers = [(name,) + load_handler(name) for name in handler_names]
+
+    connection = pika.BlockingConnection(pika.ConnectionParameters(host=rabbit_host, port=rabbit_port, heartbeat=600))
+
+    stats = []
+    for name, queue_name, callback in handlers:
+        handler_stats = HandlerStats(name, queue_name)
+        stats.append(handler_stats)
+
+        if name in DEDICATED_CONNECTION_HANDLERS:
+            start_dedicated_consumer(queue_name, handler_stats.wrap(callback))
+            continue
+
+        # One channel per queue so a slow or failing handler does not affect the others
+        channel = connection.channel()
+        channel.queue_declare(queue=queue_name, durable=True)
+        channel.basic_consume(queue=queue_name, on_message_callback=handler_stats.wrap(callback), auto_ack=True)
+
+    print(f"Consumer host is running {', '.join(handler_names)}. To exit, press Ctrl+C")
+
+    last_report = time.time()
+    while True:
+        # Dispatches deliveries for every channel on the connection
+        connection.process_data_events(time_limit=1)
+
+        now = time.time()
+        if now - last_report >= REPORT_INTERVAL:
+            for handler_stats in stats:
+                print(handler_stats.report(now - last_report))
+            last_report = now
+
+
+if __name__ == '__main__':
+    try:
+        main(selected_handlers(sys.argv[1:]))
+    except KeyboardInterrupt:
+        print("\nExiting peacefully...")
@@ -0,0 +1,305 @@
+'''
+Date: October 19, 2026
+
+Rotating CSV output for the consumers.
+
+Each sink writes into its own directory, one partition per day (or hour), and starts a new
+segment when the current one reaches its size limit:
+
+    output/adsb_data_messages/adsb_data_messages-2026-10-19-000.csv
+    output/adsb_data_messages/adsb_data_messages-2026-10-19-001.csv.gz
+    output/adsb_data_messages/adsb_data_messages-2026-10-19T13-000.csv   (hourly)
+
+Closed segments are compressed and the retention budget is enforced on a background worker
+thread, so writing a row never waits on compression or cleanup.
+'''
+import os
+import csv
+import gzip
+import time
+import queue
+import atexit
+import shutil
+import logging
+import threading
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+ROTATIONS = {'daily': '%Y-%m-%d', 'hourly': '%Y-%m-%dT%H'}
+COMPRESSIONS = {'gzip': '.gz', 'zstd': '.zst', 'none': ''}
+SEGMENT_SUFFIXES = tuple('.csv' + extension for extension in COMPRESSIONS.values())
+
+# Sidecar index files kept next to segments by history_lookup.py
+SIDECAR_SUFFIX = '.idx'
+
+# Defaults used when config.ini has no [Output] section
+DEFAULT_DIRECTORY = 'output'
+DEFAULT_ROTATION = 'daily'
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_COMPRESSION = 'gzip'
+DEFAULT_RETENTION_BYTES = 1024 * 1024 * 1024
+
+logger = logging.getLogger(__name__)
+
+# Closed segments waiting to be compressed (or None for a retention pass only), shared by
+# every sink in the process
+compression_queue = queue.Queue()
+_compression_worker = None
+_compression_worker_lock = threading.Lock()
+
+
+def compress_segment(path, compression):
+    """
+    Compresses a closed segment next to itself and removes the original.
+
+    Args:
+        path (str): Path of the uncompressed CSV segment.
+        compression (str): 'gzip' or 'zstd'.
+
+    Returns:
+        str: Path of the compressed segment.
+    """
+    target = path + COMPRESSIONS[compression]
+    temp_target = target + '.tmp'
+
+    with open(path, 'rb') as source, open(temp_target, 'wb') as raw_target:
+        if compression == 'zstd':
+            with zstandard.ZstdCompressor().stream_writer(raw_target) as compressed:
+                shutil.copyfileobj(source, compressed)
+        else:
+            with gzip.GzipFile(fileobj=raw_target, mode='wb') as compressed:
+                shutil.copyfileobj(source, compressed)
+
+    # Rename first so a crash never leaves the data only in a partial file
+    os.replace(temp_target, target)
+
+    # Index now, while the segment can still be memory-mapped, so lookups never have to
+    # decompress a segment that holds nothing they are after
+    try:
+        from history_lookup import index_closed_segment
+        index_closed_segment(path, target)
+    except Exception as e:
+        logger.error(f"Error indexing {target}: {str(e)}")
+
+    os.remove(path)
+    if os.path.exists(path + SIDECAR_SUFFIX):
+        os.remove(path + SIDECAR_SUFFIX)
+    return target
+
+
+def _run_compression_worker():
+    while True:
+        sink, path = compression_queue.get()
+        try:
+            if path is not None and os.path.exists(path):
+                compress_segment(path, sink.compression)
+            sink.enforce_retention()
+        except Exception as e:
+            logger.error(f"Error compressing or expiring segments of {sink.name}: {str(e)}")
+        finally:
+            compression_queue.task_done()
+
+
+def _ensure_compression_worker():
+    global _compression_worker
+    with _compression_worker_lock:
+        if _compression_worker is None:
+            _compression_worker = threading.Thread(target=_run_compression_worker)
+            _compression_worker.daemon = True
+            _compression_worker.start()
+
+
+class RotatingCsvSink:
+    """
+    Appends CSV rows to time-partitioned, size-limited segments.
+
+    Args:
+        name (str): Base name of the output, e.g. 'adsb_data_messages'.
+        headers (list): CSV header row written at the top of every segment.
+        directory (str): Root output directory; the sink writes into `directory/name`.
+        rotation (str): 'daily' or 'hourly' partitions.
+        max_bytes (int): Size at which a segment is closed and a new one started.
+        compression (str): 'gzip', 'zstd' or 'none' for closed segments.
+        retention_bytes (int): Total size of closed segments to keep; the oldest are
+                               deleted first. 0 keeps everything.
+    """
+
+    def __init__(self, name, headers, directory=DEFAULT_DIRECTORY, rotation=DEFAULT_ROTATION,
+                 max_bytes=DEFAULT_MAX_BYTES, compression=DEFAULT_COMPRESSION,
+                 retention_bytes=DEFAULT_RETENTION_BYTES):
+        if rotation not in ROTATIONS:
+            raise ValueError(f"Unknown rotation: {rotation}")
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown compression: {compression}")
+        if compression == 'zstd' and zstandard is None:
+            logger.warning("zstandard is not installed, compressing segments with gzip instead")
+            compression = 'gzip'
+
+        self.name = name
+        self.headers = headers
+        self.directory = os.path.join(directory, name)
+        self.rotation = rotation
+        self.max_bytes = max_bytes
+        self.compression = compression
+        self.retention_bytes = retention_bytes
+
+        self._lock = threading.Lock()
+        self._file = None
+        self._writer = None
+        self._partition = None
+        self._sequence = 0
+        self.path = None
+
+        os.makedirs(self.directory, exist_ok=True)
+        _ensure_compression_worker()
+        self._requeue_closed_segments()
+        atexit.register(self.close)
+
+    def write_row(self, row):
+        """
+        Appends one row, rotating to a new segment first if the partition changed or the
+        current segment is full.
+        """
+        with self._lock:
+            partition = time.strftime(ROTATIONS[self.rotation])
+            if partition != self._partition:
+                self._open_partition(partition)
+            elif self._file.tell() >= self.max_bytes:
+                self._open_segment(self._sequence + 1)
+
+            self._writer.writerow(row)
+            self._file.flush()
+
+    def close(self):
+        """
+        Flushes and closes the current segment. It is left uncompressed so a restarted
+        consumer keeps appending to it.
+        """
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                self._writer = None
+                self._partition = None
+
+    def _segment_key(self, entry):
+        # (partition, sequence) of a segment file name; the sequence is compared as a number
+        # so segment 1000 sorts after segment 999
+        partition, _, sequence = entry[len(self.name) + 1:].split('.', 1)[0].rpartition('-')
+        return partition, int(sequence) if sequence.isdigit() else -1
+
+    def segments(self):
+        """
+        Returns the paths of every segment of this sink, oldest first.
+        """
+        prefix = self.name + '-'
+        names = sorted((entry for entry in os.listdir(self.directory)
+                        if entry.startswith(prefix) and entry.endswith(SEGMENT_SUFFIXES)),
+                       key=self._segment_key)
+        return [os.path.join(self.directory, entry) for entry in names]
+
+    def enforce_retention(self):
+        """
+        Deletes the oldest closed segments until they fit in the retention budget. Runs on
+        the background worker.
+        """
+        if not self.retention_bytes:
+            return
+        # Listing under the lock means a segment opened afterwards is never a candidate
+        with self._lock:
+            active_path = self.path
+            segments = self.segments()
+        # The segment being written is never deleted, nor is the newest one, which a
+        # restarted consumer resumes
+        closed = [path for path in segments[:-1] if path != active_path]
+        sizes = {path: os.path.getsize(path) for path in closed}
+        total = sum(sizes.values())
+        for path in closed:
+            if total <= self.retention_bytes:
+                break
+            os.remove(path)
+            if os.path.exists(path + SIDECAR_SUFFIX):
+                os.remove(path + SIDECAR_SUFFIX)
+            total -= sizes[path]
+            logger.info(f"Retention budget exceeded, removed {path}")
+
+    def _segment_path(self, partition, sequence):
+        return os.path.join(self.directory, f"{self.name}-{partition}-{sequence:03d}.csv")
+
+    def _open_partition(self, partition):
+        # Resume the newest segment of the partition after a restart, if it still has room
+        sequences = [sequence for segment_partition, sequence in
+                     (self._segment_key(os.path.basename(path)) for path in self.segments())
+                     if segment_partition == partition and sequence >= 0]
+        sequence = max(sequences, default=0)
+        path = self._segment_path(partition, sequence)
+        if sequences and (not os.path.exists(path) or os.path.getsize(path) >= self.max_bytes):
+            sequence += 1
+        self._partition = partition
+        self._open_segment(sequence)
+
+    def _open_segment(self, sequence):
+        self._close_segment()
+        self._sequence = sequence
+        self.path = self._segment_path(self._partition, sequence)
+
+        exists = os.path.exists(self.path)
+        self._file = open(self.path, mode='a', newline='')
+        self._writer = csv.writer(self._file)
+        if not exists:
+            self._writer.writerow(self.headers)
+
+    def _close_segment(self):
+        if self._file is None:
+            return
+        self._file.close()
+        self._file = None
+        closed_path = self.path
+        self.path = None
+        # Compression (if any) and retention both run on the background worker
+        compression_queue.put((self, closed_path if self.compression != 'none' else None))
+
+    def _requeue_closed_segments(self):
+        # Segments left uncompressed by an earlier run are handed to the worker, which also
+        # applies the retention budget. Only the newest segment of the current partition is
+        # kept back, and only while it has room, as that is the one _open_partition resumes
+        if self.compression == 'none':
+            compression_queue.put((self, None))
+            return
+        current_prefix = f"{self.name}-{time.strftime(ROTATIONS[self.rotation])}-"
+        plain = [path for path in self.segments() if path.endswith('.csv')]
+        resumable = [path for path in plain if os.path.basename(path).startswith(current_prefix)]
+        resumed = None
+        if resumable and os.path.getsize(resumable[-1]) < self.max_bytes:
+            resumed = resumable[-1]
+        for path in plain:
+            if path != resumed:
+                compression_queue.put((self, path))
+        compression_queue.put((self, None))
+
+
+def sink_from_config(config, name, headers, directory=None):
+    """
+    Creates a RotatingCsvSink using the optional [Output] section of config.ini.
+
+    Args:
+        config (configparser.ConfigParser): The loaded configuration.
+        name (str): Base name of the output, e.g. 'adsb_data_messages'.
+        headers (list): CSV header row.
+        directory (str): Root directory to use instead of the configured one.
+
+    Returns:
+        RotatingCsvSink: The configured sink.
+    """
+    return RotatingCsvSink(
+        name,
+        headers,
+        directory=directory or config.get('Output', 'Directory', fallback=DEFAULT_DIRECTORY),
+        rotation=config.get('Output', 'Rotation', fallback=DEFAULT_ROTATION),
+        max_bytes=config.getint('Output', 'MaxBytes', fallback=DEFAULT_MAX_BYTES),
+        compression=config.get('Output', 'Compression', fallback=DEFAULT_COMPRESSION),
+        retention_bytes=config.getint('Output', 'RetentionBytes', fallback=DEFAULT_RETENTION_BYTES),
+    )
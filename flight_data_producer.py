@@ -3,6 +3,7 @@ Auhtor: Pasquale Salomone
 Date: Septmber 29, 2023
 '''
 import queue
+import array
 import socket
 import pika
 import time
@@ -10,12 +11,22 @@ import logging
 import configparser
 import threading
 from queue import Queue
+from aircraft_state_api import AircraftStateTable, start_state_api, DEFAULT_PORT as STATE_API_DEFAULT_PORT
+from overload_controller import OverloadController, SHED_HEADERS, DEFAULT_SHED_DIRECTORY
+from csv_sink import sink_from_config
+
+try:
+    import fcntl
+    import termios
+except ImportError:
+    fcntl = termios = None
 
 # Define the names of the queues
 my_queues = {1: 'transponder_queue',
              2: 'adsb_data_queue',
              3: 'aircraft_icao_id_queue',
-             4: 'nav_data'
+             4: 'nav_data',
+             5: 'emergency_queue'
              }
 
 # Define the msg_type
@@ -23,6 +34,11 @@ MSG_TYPE_TRANSPONDER = 1
 MSG_TYPE_ADSB = 2
 MSG_TYPE_AIRCRAFT_ICAO_ID = 3
 MSG_NAV_DATA = 4
+MSG_TYPE_EMERGENCY = 5
+
+# Squawk codes that are published on the emergency queue as soon as they are parsed
+# (7500 hijacking, 7600 radio failure, 7700 general emergency)
+EMERGENCY_SQUAWKS = ('7500', '7600', '7700')
 
 # Load the configuration parameters from a file
 config = configparser.ConfigParser()
@@ -32,6 +48,16 @@ config.read('config.ini')
 piaware_ip = config['PiAware']['IP']
 piaware_port = int(config['PiAware']['Port'])
 rabbitmq_host = config['RabbitMQ']['Host']
+state_api_enabled = config.getboolean('StateAPI', 'Enabled', fallback=True)
+state_api_host = config.get('StateAPI', 'Host', fallback='127.0.0.1')
+state_api_port = config.getint('StateAPI', 'Port', fallback=STATE_API_DEFAULT_PORT)
+shed_interval = config.getfloat('LoadShedding', 'Interval', fallback=5.0)
+shed_backlog_high = config.getint('LoadShedding', 'BacklogHigh', fallback=64 * 1024)
+shed_backlog_low = config.getint('LoadShedding', 'BacklogLow', fallback=8 * 1024)
+shed_queue_high = config.getint('LoadShedding', 'QueueHigh', fallback=10000)
+shed_queue_low = config.getint('LoadShedding', 'QueueLow', fallback=1000)
+shed_directory = config.get('LoadShedding', 'Directory', fallback=DEFAULT_SHED_DIRECTORY)
+queue_check_interval = config.getfloat('LoadShedding', 'QueueCheckInterval', fallback=5.0)
 
 # Set up the logging
 logger = logging.getLogger(__name__)
@@ -120,6 +146,18 @@ message_buffer = Queue(maxsize=100)  # Adjust the buffer size as needed
 # Define a lock to ensure thread-safe access to the buffer
 buffer_lock = threading.Lock()
 
+# Latest known state of every aircraft, served by aircraft_state_api.py
+aircraft_state = AircraftStateTable()
+
+# Under overload, positions (MSG,3) and velocities (MSG,4) are downsampled per aircraft;
+# transponder (MSG,6) and identification (MSG,1) messages are always sent
+overload = OverloadController({MSG_TYPE_ADSB: shed_interval, MSG_NAV_DATA: shed_interval},
+                              type_names=my_queues,
+                              backlog_high=shed_backlog_high, backlog_low=shed_backlog_low,
+                              queue_high=shed_queue_high, queue_low=shed_queue_low,
+                              sink=sink_from_config(config, 'shed_messages', SHED_HEADERS,
+                                                    directory=shed_directory))
+
 def publish_message_to_queue(channel, message_type, body_content):
     """
     Publishes a message to the specified RabbitMQ queue.
@@ -139,34 +177,120 @@ def publish_message_to_queue(channel, message_type, body_content):
     except pika.exceptions.AMQPConnectionError as e:
         logger.error(f"Error sending message to queue: {str(e)}")
     
-def empty_buffer():
+def shed_buffer():
+    """
+    Drops the sheddable messages from the buffer, keeping the others in their original order.
+    Every dropped message is recorded by the overload controller.
+    """
+    kept = []
     while not message_buffer.empty():
         try:
-            message_buffer.get_nowait()
+            message_type, body_content = message_buffer.get_nowait()
         except queue.Empty:
-            break  
+            break
+        if overload.is_sheddable(message_type):
+            overload.record_shed(message_type, body_content.split(',', 2)[1])
+        else:
+            kept.append((message_type, body_content))
+    for message in kept:
+        message_buffer.put_nowait(message)
+
+def publish_buffered_messages(channel):
+    """
+    Publishes everything in the buffer, in order.
+    """
+    while not message_buffer.empty():
+        message_type, body_content = message_buffer.get()
+        publish_message_to_queue(channel, message_type, body_content)
+
+def buffer_message(channel, message_type, aircraft_icao_id, body_content):
+    """
+    Adds a message to the buffer unless the overload controller sheds it.
+
+    Never blocks: if the buffer is full, a position or velocity message is shed. Any other
+    message makes room by shedding the buffered positions and velocities, or by publishing
+    the buffer early if nothing can be shed.
+
+    Args:
+        channel: A RabbitMQ channel object.
+        message_type (int): An integer indicating the message type.
+        aircraft_icao_id (str): The aircraft the message is about.
+        body_content (str): The content of the message to be sent.
+    """
+    if not overload.admit(message_type, aircraft_icao_id):
+        return
+
+    with buffer_lock:
+        try:
+            message_buffer.put_nowait((message_type, body_content))
+            return
+        except queue.Full:
+            pass
+
+        if overload.is_sheddable(message_type):
+            overload.record_shed(message_type, aircraft_icao_id)
+            return
+
+        print("Buffer is full. Shedding position and velocity messages.")
+        shed_buffer()
+        if message_buffer.full():
+            publish_buffered_messages(channel)
+        message_buffer.put_nowait((message_type, body_content))
+
+def socket_backlog(sock):
+    """
+    Returns the number of bytes received from PiAware that have not been read yet, i.e.
+    how far the producer is behind the feed. Always 0 where FIONREAD is unavailable.
+    """
+    if fcntl is None:
+        return 0
+    pending = array.array('i', [0])
+    try:
+        fcntl.ioctl(sock.fileno(), termios.FIONREAD, pending)
+    except OSError:
+        return 0
+    return pending[0]
 
-def process_buffered_messages(channel):
+def broker_queue_depths(channel):
+    """
+    Returns the number of messages waiting in each data queue.
+
+    Args:
+        channel: A RabbitMQ channel object used only for these checks.
+
+    Returns:
+        dict: Queue name -> ready message count, or None if the check failed.
+    """
+    depths = {}
+    try:
+        for message_type in (MSG_TYPE_TRANSPONDER, MSG_TYPE_ADSB, MSG_TYPE_AIRCRAFT_ICAO_ID, MSG_NAV_DATA):
+            # A passive declare only reports on the queue, it never creates or changes it
+            result = channel.queue_declare(queue=my_queues[message_type], durable=True, passive=True)
+            depths[my_queues[message_type]] = result.method.message_count
+    except pika.exceptions.AMQPError as e:
+        # e.g. ChannelClosedByBroker (404) for a deleted queue; this only closes the
+        # monitoring channel, and the controller keeps its last reading
+        logger.error(f"Error checking broker queue depths: {str(e)}")
+        return None
+    return depths
+
+def process_buffered_messages(channel, backlog=0, queue_depths=None):
     """
     Processes messages from the buffer and publishes them to RabbitMQ.
 
     Args:
         channel: A RabbitMQ channel object.
+        backlog (int): Unread bytes waiting on the PiAware socket.
+        queue_depths (dict): Latest broker queue depths, if they were just measured.
 
     This function processes messages from the message buffer and publishes them to the appropriate
     RabbitMQ queue. It ensures that messages are sent in the correct order.
     """
     print(f"Buffer Length: {message_buffer.qsize()}")  # Print the buffer length here
-    
-    if message_buffer.full():
-        print("Buffer is full. Emptying the buffer.")
-        empty_buffer()  # Call the function to empty the buffer
 
+    overload.observe(backlog, queue_depths)
 
-    while not message_buffer.empty():
-        message = message_buffer.get()
-        message_type, body_content = message
-        publish_message_to_queue(channel, message_type, body_content)
+    publish_buffered_messages(channel)
 
     
 
@@ -228,12 +352,17 @@ def extract_and_send_adsb_data(piaware_ip, piaware_port, rabbitmq_host):
         channel.queue_declare(queue=my_queues[2], durable=True)
         channel.queue_declare(queue=my_queues[3], durable=True)
         channel.queue_declare(queue=my_queues[4], durable=True)
+        channel.queue_declare(queue=my_queues[5], durable=True)
 
         # Start the heartbeat thread
         heartbeat_thread = threading.Thread(target=send_heartbeat, args=(channel, my_queues[2]))
         heartbeat_thread.daemon = True  # Allow the thread to exit when the main program exits
         heartbeat_thread.start()
 
+        # Queue depth checks get a channel of their own, so a failed check never closes the
+        # channel messages are published on
+        monitor_channel = connection.channel()
+        last_queue_check = 0
         while True:
             try:
                 data = sock.recv(4096)
@@ -245,35 +374,52 @@ def extract_and_send_adsb_data(piaware_ip, piaware_port, rabbitmq_host):
                 for line in data.decode('utf-8', 'ignore').strip().split('\n'):
                     if line[0:5] == 'MSG,3' and len(line) == 104:
                         message_type = MSG_TYPE_ADSB
-                        body_content = ','.join(extract_info(line, line[0:5].replace(',', '')))
+                        fields = extract_info(line, line[0:5].replace(',', ''))
+                        aircraft_state.update(fields)
+                        body_content = ','.join(fields)
 
                         # Add messages to the buffer queue instead of directly sending them
-                        with buffer_lock:
-                            message_buffer.put((message_type, body_content))
+                        buffer_message(channel, message_type, fields[1], body_content)
 
                     if line[0:5] == "MSG,6" and len(line) >= 86:
                         message_type = MSG_TYPE_TRANSPONDER
-                        body_content = ','.join(extract_info(line, line[0:5].replace(',', '')))
+                        fields = extract_info(line, line[0:5].replace(',', ''))
+                        aircraft_state.update(fields)
+                        body_content = ','.join(fields)
+
+                        # Emergencies skip the buffer and go out right away on their own queue;
+                        # the buffered copy below is still persisted by the transponder consumer
+                        if fields[4].strip() in EMERGENCY_SQUAWKS:
+                            publish_message_to_queue(channel, MSG_TYPE_EMERGENCY, body_content)
 
-                        with buffer_lock:
-                            message_buffer.put((message_type, body_content))
+                        buffer_message(channel, message_type, fields[1], body_content)
 
                     if line[0:5] == "MSG,1" and len(line) >= 86:
                         message_type = MSG_TYPE_AIRCRAFT_ICAO_ID
-                        body_content = ','.join(extract_info(line, line[0:5].replace(',', '')))
+                        fields = extract_info(line, line[0:5].replace(',', ''))
+                        aircraft_state.update(fields)
+                        body_content = ','.join(fields)
 
-                        with buffer_lock:
-                            message_buffer.put((message_type, body_content))
+                        buffer_message(channel, message_type, fields[1], body_content)
 
                     if line[0:5] == "MSG,4" and len(line) >= 86:
                         message_type = MSG_NAV_DATA
-                        body_content = ','.join(extract_info(line, line[0:5].replace(',', '')))
+                        fields = extract_info(line, line[0:5].replace(',', ''))
+                        aircraft_state.update(fields)
+                        body_content = ','.join(fields)
 
-                        with buffer_lock:
-                            message_buffer.put((message_type, body_content))
+                        buffer_message(channel, message_type, fields[1], body_content)
+
+                # Check how far behind the consumers are every queue_check_interval seconds
+                queue_depths = None
+                if time.time() - last_queue_check >= queue_check_interval:
+                    if monitor_channel.is_closed:
+                        monitor_channel = connection.channel()
+                    queue_depths = broker_queue_depths(monitor_channel)
+                    last_queue_check = time.time()
 
                 # Process buffered messages
-                process_buffered_messages(channel)
+                process_buffered_messages(channel, socket_backlog(sock), queue_depths)
 
             except socket.timeout:
                 logger.info("No data received for 15 seconds. Closing the connection.")
@@ -314,6 +460,13 @@ def extract_and_send_adsb_data(piaware_ip, piaware_port, rabbitmq_host):
 
 try:
     if __name__ == '__main__':
+        # Serve the latest aircraft state while messages are being produced
+        if state_api_enabled:
+            try:
+                start_state_api(aircraft_state, state_api_host, state_api_port)
+            except OSError as e:
+                # The API is optional; never let it stop ingestion
+                logger.error(f"Could not start aircraft state API on {state_api_host}:{state_api_port}: {str(e)}")
         # Start extracting and sending filtered ADS-B data to the appropriate queues
         extract_and_send_adsb_data(piaware_ip, piaware_port, rabbitmq_host)
 except KeyboardInterrupt:
@@ -0,0 +1,418 @@
+'''
+Date: October 19, 2026
+
+Indexed lookup of stored consumer output by aircraft ICAO ID and time range.
+
+Every output file gets a sidecar index (`<file>.idx`) that splits the file into blocks of
+rows and records, for each block, its byte range and time range, plus the blocks each
+aircraft ICAO ID appears in. Indexes are brought up to date incrementally before every
+query, so a growing file only has its new rows indexed. A query then memory-maps the file
+and reads only the blocks that can contain matching rows.
+
+Usage:
+    python history_lookup.py index output/
+    python history_lookup.py query output/adsb_data_messages --icao A1B2C3
+    python history_lookup.py query transponder_messages.csv --since "2023/09/26 14:00" --until "2023/09/26 15:00"
+
+Paths may be output files or directories, which are searched recursively. Compressed
+segments written by csv_sink.py never change, so their index is built when they are
+compressed and trusted as long as the file's size and modification time match. A compressed
+segment is only decompressed (in memory) when its index has blocks that can match.
+Time ranges are always checked against the row times in the index, never against the
+partition in a segment's file name, which is when the row was written, not received.
+'''
+import os
+import sys
+import gzip
+import json
+import mmap
+import hashlib
+import argparse
+
+from csv_sink import SEGMENT_SUFFIXES, SIDECAR_SUFFIX
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Target size of an index block; a query reads at least one whole block
+BLOCK_SIZE = 64 * 1024
+
+# Bytes at the start of a file used to detect that it was replaced rather than appended to
+HEAD_SIZE = 1024
+
+INDEX_VERSION = 1
+
+HEADER_PREFIX = b'type_msg,'
+
+COMPRESSED_SUFFIXES = ('.gz', '.zst')
+
+
+def time_key(text):
+    """
+    Normalises a time given as 'YYYY/MM/DD HH:MM:SS.fff' (the format of the first_date and
+    first_timestamp columns) or 'YYYY-MM-DDTHH:MM:SS' so that times compare as strings.
+    """
+    text = text.strip().replace('T', ' ', 1)
+    date, _, clock = text.partition(' ')
+    return f"{date.replace('-', '/')} {clock}".strip()
+
+
+def has_output_header(path):
+    """
+    Returns True if a file starts with the consumer output header (`type_msg,...`). Other
+    CSV files, such as the producer's shed records, have a different layout.
+    """
+    try:
+        if path.endswith('.gz'):
+            with gzip.open(path, 'rb') as compressed:
+                head = compressed.read(len(HEADER_PREFIX))
+        elif path.endswith('.zst'):
+            if zstandard is None:
+                raise RuntimeError(f"zstandard is required to read {path}")
+            with open(path, 'rb') as compressed:
+                head = zstandard.ZstdDecompressor().stream_reader(compressed).read(len(HEADER_PREFIX))
+        else:
+            with open(path, 'rb') as plain:
+                head = plain.read(len(HEADER_PREFIX))
+    except (OSError, EOFError):
+        return False
+    return head == HEADER_PREFIX
+
+
+def find_output_files(paths):
+    """
+    Expands the given files and directories into a sorted list of consumer output files.
+    Files without the consumer output header are skipped.
+    """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                for name in names:
+                    full_path = os.path.join(root, name)
+                    if name.endswith(SEGMENT_SUFFIXES):
+                        files.append(full_path)
+                    elif name.endswith(SIDECAR_SUFFIX) and not os.path.exists(full_path[:-len(SIDECAR_SUFFIX)]):
+                        # The segment was compressed or removed by retention
+                        os.remove(full_path)
+        else:
+            files.append(path)
+    return sorted(path for path in files if has_output_header(path))
+
+
+class OutputFile:
+    """
+    An output file opened for indexing and lookups.
+
+    Plain CSV files are memory-mapped; compressed segments are decompressed into memory.
+    Use as a context manager.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+        self.data = b''
+
+    def __enter__(self):
+        if self.path.endswith('.gz'):
+            with gzip.open(self.path, 'rb') as compressed:
+                self.data = compressed.read()
+        elif self.path.endswith('.zst'):
+            if zstandard is None:
+                raise RuntimeError(f"zstandard is required to read {self.path}")
+            with open(self.path, 'rb') as compressed:
+                self.data = zstandard.ZstdDecompressor().decompressobj().decompress(compressed.read())
+        else:
+            self._file = open(self.path, 'rb')
+            if os.fstat(self._file.fileno()).st_size:
+                self.data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        return self
+
+    def __exit__(self, *exc_info):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        if self._file is not None:
+            self._file.close()
+
+
+def source_stamp(path):
+    """
+    Returns [size, mtime_ns] of a file, used to tell if a compressed segment's index is current.
+    """
+    stat = os.stat(path)
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+def _empty_index(head):
+    return {'version': INDEX_VERSION, 'head': head, 'size': 0, 'blocks': [], 'icao': {}}
+
+
+def load_index(path):
+    """
+    Returns the sidecar index of an output file, or None if it is missing or unreadable.
+    """
+    try:
+        with open(path + SIDECAR_SUFFIX, 'r') as index_file:
+            index = json.load(index_file)
+    except (OSError, ValueError):
+        return None
+    if index.get('version') != INDEX_VERSION:
+        return None
+    return index
+
+
+def save_index(path, index):
+    temp_path = path + SIDECAR_SUFFIX + '.tmp'
+    with open(temp_path, 'w') as index_file:
+        json.dump(index, index_file, separators=(',', ':'))
+    os.replace(temp_path, path + SIDECAR_SUFFIX)
+
+
+def update_index(output_file):
+    """
+    Brings the sidecar index of an open output file up to date and returns it.
+
+    Only rows appended since the last update are read, unless the file shrank or its head
+    changed, in which case it is indexed from scratch.
+
+    Args:
+        output_file (OutputFile): The open output file.
+
+    Returns:
+        dict: The index, with 'blocks' as [start, end, first_time, last_time] entries and
+              'icao' mapping each aircraft ICAO ID to the ids of the blocks it appears in.
+    """
+    data = output_file.data
+    head = hashlib.sha1(data[:HEAD_SIZE]).hexdigest()
+
+    index = load_index(output_file.path)
+    if index is None or index['size'] > len(data) or (index['size'] >= HEAD_SIZE and index['head'] != head):
+        index = _empty_index(head)
+
+    # Only whole lines are indexed; a row still being written is picked up next time
+    end = data.rfind(b'\n') + 1
+    if end <= index['size']:
+        return index
+
+    blocks = index['blocks']
+    icao_blocks = index['icao']
+
+    # Re-index an undersized final block so appends do not leave a trail of tiny blocks
+    if blocks and blocks[-1][1] - blocks[-1][0] < BLOCK_SIZE:
+        last_id = len(blocks) - 1
+        index['size'] = blocks.pop()[0]
+        for block_ids in icao_blocks.values():
+            if block_ids and block_ids[-1] == last_id:
+                block_ids.pop()
+
+    position = index['size']
+    while position < end:
+        block_id = len(blocks)
+        block_start = position
+        first_time = last_time = None
+        seen = set()
+
+        while position < end and position - block_start < BLOCK_SIZE:
+            line_end = data.find(b'\n', position, end) + 1
+            line = data[position:line_end]
+            position = line_end
+
+            if line.startswith(HEADER_PREFIX):
+                continue
+            fields = line.split(b',', 4)
+            if len(fields) < 4:
+                continue
+
+            aircraft_icao_id = fields[1].decode('utf-8', 'ignore')
+            row_time = time_key(f"{fields[2].decode('utf-8', 'ignore')} {fields[3].decode('utf-8', 'ignore')}")
+            if first_time is None or row_time < first_time:
+                first_time = row_time
+            if last_time is None or row_time > last_time:
+                last_time = row_time
+            if aircraft_icao_id not in seen:
+                seen.add(aircraft_icao_id)
+                icao_blocks.setdefault(aircraft_icao_id, []).append(block_id)
+
+        blocks.append([block_start, position, first_time, last_time])
+
+    index['size'] = end
+    index['head'] = head
+    if output_file.path.endswith(COMPRESSED_SUFFIXES):
+        index['source'] = source_stamp(output_file.path)
+    save_index(output_file.path, index)
+    return index
+
+
+def load_compressed_index(path):
+    """
+    Returns the index of a compressed segment without decompressing it, or None if the
+    index is missing or does not belong to the file as it is now.
+    """
+    index = load_index(path)
+    if index is None or index.get('source') != source_stamp(path):
+        return None
+    return index
+
+
+def index_closed_segment(path, compressed_path):
+    """
+    Indexes a plain segment and saves the index for its compressed copy. Offsets refer to
+    the uncompressed data, so they hold for both. Called by csv_sink.py before the plain
+    segment is removed.
+
+    Args:
+        path (str): The plain CSV segment.
+        compressed_path (str): The compressed copy that replaces it.
+    """
+    with OutputFile(path) as output_file:
+        index = update_index(output_file)
+    index['source'] = source_stamp(compressed_path)
+    save_index(compressed_path, index)
+
+
+def matching_blocks(index, icao=None, since=None, until=None):
+    """
+    Returns the blocks that may hold matching rows as (start, end, needs_time_check)
+    tuples; needs_time_check is False for blocks that lie entirely inside the time range.
+    """
+    if icao is not None:
+        candidates = index['icao'].get(icao, [])
+    else:
+        candidates = range(len(index['blocks']))
+
+    ranges = []
+    for block_id in candidates:
+        start, end, first_time, last_time = index['blocks'][block_id]
+        if first_time is None:
+            continue
+        if since is not None and last_time < since:
+            continue
+        if until is not None and first_time > until:
+            continue
+        needs_time_check = (since is not None and first_time < since) or (until is not None and last_time > until)
+        ranges.append((start, end, needs_time_check))
+    return ranges
+
+
+def _block_lines(data, start, end, icao_needle):
+    # With an aircraft to look for, jump between its occurrences instead of splitting
+    # every line of the block
+    if icao_needle is None:
+        yield from data[start:end].splitlines()
+        return
+    position = data.find(icao_needle, start, end)
+    while position != -1:
+        line_start = data.rfind(b'\n', start, position) + 1 or start
+        line_end = data.find(b'\n', position, end)
+        if line_end == -1:
+            line_end = end
+        line = data[line_start:line_end].rstrip(b'\r')
+        # Only the aircraft_icao_id column counts, not a match elsewhere in the row
+        if line.split(b',', 2)[1:2] == [icao_needle[1:-1]]:
+            yield line
+        position = data.find(icao_needle, line_end, end)
+
+
+def query_file(path, icao=None, since=None, until=None):
+    """
+    Yields the raw CSV lines (bytes, without line endings) of one output file that match
+    the given aircraft ICAO ID and inclusive time range. The header line is yielded first
+    if any row matches. A file without the consumer output header yields nothing.
+    """
+    icao_needle = b',' + icao.encode('utf-8') + b',' if icao is not None else None
+
+    index = None
+    if path.endswith(COMPRESSED_SUFFIXES):
+        index = load_compressed_index(path)
+        if index is not None and not matching_blocks(index, icao, since, until):
+            return
+
+    with OutputFile(path) as output_file:
+        if index is None:
+            index = update_index(output_file)
+        data = output_file.data
+        header = data[:data.find(b'\n')].rstrip(b'\r')
+        if not header.startswith(HEADER_PREFIX):
+            return
+        header_sent = False
+
+        for start, end, needs_time_check in matching_blocks(index, icao, since, until):
+            for line in _block_lines(data, start, end, icao_needle):
+                if line.startswith(HEADER_PREFIX):
+                    continue
+                if needs_time_check:
+                    fields = line.split(b',', 4)
+                    if len(fields) < 4:
+                        continue
+                    row_time = time_key(f"{fields[2].decode('utf-8', 'ignore')} {fields[3].decode('utf-8', 'ignore')}")
+                    if since is not None and row_time < since:
+                        continue
+                    if until is not None and row_time > until:
+                        continue
+                if not header_sent:
+                    header_sent = True
+                    yield header
+                yield line
+
+
+def query(paths, icao=None, since=None, until=None):
+    """
+    Yields matching CSV lines from every output file under the given paths. A header line
+    is emitted whenever the column layout changes.
+    """
+    last_header = None
+    for path in find_output_files(paths):
+        pending_header = None
+        for line in query_file(path, icao, since, until):
+            if line.startswith(HEADER_PREFIX):
+                pending_header = line
+                continue
+            if pending_header is not None and pending_header != last_header:
+                yield pending_header
+                last_header = pending_header
+            pending_header = None
+            yield line
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Indexed lookup of stored consumer output.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    index_parser = subparsers.add_parser('index', help="Build or update the sidecar indexes.")
+    index_parser.add_argument('paths', nargs='+', help="Output files or directories.")
+
+    query_parser = subparsers.add_parser('query', help="Print rows for an aircraft and/or time range.")
+    query_parser.add_argument('paths', nargs='+', help="Output files or directories.")
+    query_parser.add_argument('--icao', help="Aircraft ICAO ID, e.g. A1B2C3.")
+    query_parser.add_argument('--since', help="Start time, e.g. '2023/09/26 14:00'.")
+    query_parser.add_argument('--until', help="End time (inclusive), e.g. '2023/09/26 15:00'.")
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'index':
+        for path in find_output_files(args.paths):
+            index = load_compressed_index(path) if path.endswith(COMPRESSED_SUFFIXES) else None
+            if index is None:
+                with OutputFile(path) as output_file:
+                    index = update_index(output_file)
+            print(f"{path}: {len(index['blocks'])} blocks, {len(index['icao'])} aircraft")
+        return
+
+    icao = args.icao.upper() if args.icao else None
+    since = time_key(args.since) if args.since else None
+    # A bare date or minute as the end of the range covers everything within it
+    until = time_key(args.until) + '\uffff' if args.until else None
+
+    out = sys.stdout.buffer
+    for line in query(args.paths, icao, since, until):
+        out.write(line + b'\n')
+    out.flush()
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except KeyboardInterrupt:
+        print("\nExiting peacefully...")
@@ -4,23 +4,15 @@ Date: September 26, 2023
 """
 
 import pika
-import csv
-import configparser
-
-# Load the configuration parameters from a file
-config = configparser.ConfigParser()
-config.read('config.ini')
-
-# Get the configuration parameters
-rabbit_host = config['RabbitMQ']['rabbit_host']
-rabbit_port = int(config['RabbitMQ']['rabbit_port'])
-
-# CSV file configuration
-csv_filename = 'nav_data_messages.csv'
+from csv_sink import sink_from_config
+from consumer_common import config, rabbit_host, rabbit_port, decode_message
 
 # CSV headers
 csv_headers = ['type_msg', 'aircraft_icao_id', 'first_date', 'first_timestamp', 'speed', 'heading']
 
+# Rotating CSV output (see csv_sink.py)
+csv_sink = sink_from_config(config, 'nav_data_messages', csv_headers)
+
 # Queue name
 queue_name = 'nav_data'
 def nav_data_callback(ch, method, properties, body):
@@ -37,13 +29,10 @@ def nav_data_callback(ch, method, properties, body):
         None.
     """    
     try:
-        # Decode the message from bytes to a string
-        body_str = body.decode('utf-8')
-        # Check if the message is a heartbeat message
-        if body_str == "Heartbeat Message":
-            # Ignore heartbeat messages
+        fields = decode_message(body)
+        # Ignore heartbeat messages
+        if fields is None:
             return
-        fields = body_str.split(',')
 
         # Extract relevant information
         type_msg = fields[0]
@@ -53,22 +42,8 @@ def nav_data_callback(ch, method, properties, body):
         speed = fields[4]
         heading = fields[5]
 
-        # Check if the CSV file exists, and create it with headers if not
-        csv_exists = False
-        try:
-            with open(csv_filename, 'r') as csv_file:
-                csv_exists = True
-        except FileNotFoundError:
-            pass
-
-        with open(csv_filename, mode='a', newline='') as csv_file:
-            csv_writer = csv.writer(csv_file)
-
-            # Write headers if the file is newly created
-            if not csv_exists:
-                csv_writer.writerow(csv_headers)
-
-            csv_writer.writerow([type_msg, aircraft_icao_id, first_date, first_timestamp, speed, heading])
+        # Append the message to the current output segment
+        csv_sink.write_row([type_msg, aircraft_icao_id, first_date, first_timestamp, speed, heading])
 
         print(f"Received ADSB data (speed, heading) for aircraft ICAO ID: {aircraft_icao_id} / {speed} / {heading}")
 
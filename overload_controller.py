@@ -0,0 +1,142 @@
+'''
+Date: October 19, 2026
+
+Adaptive load shedding for the producer.
+
+The controller watches how far the producer is behind the feed (bytes received from
+PiAware but not yet read) and the depth of the broker queues, i.e. how far the consumers
+are behind. When either crosses its high watermark it starts shedding: message types with
+a shedding interval are cut to at most one message per aircraft per interval, while every
+other type is kept in full. Once both fall below their low watermarks full rate is restored. Every
+shed message is counted per message type and aircraft, and each shedding episode is logged
+and, if a sink is given, written out as one row per message type and aircraft.
+'''
+import time
+import logging
+from collections import Counter
+
+# Columns of the shed record written at the end of each episode
+SHED_HEADERS = ['episode_start', 'episode_end', 'message_type', 'aircraft_icao_id', 'shed_count']
+
+# Shed records are kept apart from the consumer output, which history_lookup.py searches
+DEFAULT_SHED_DIRECTORY = 'shed_records'
+
+logger = logging.getLogger(__name__)
+
+
+class OverloadController:
+    """
+    Decides which messages to drop while the producer or the consumers are falling behind.
+
+    Args:
+        shed_intervals (dict): Message type -> minimum seconds between kept messages of that
+                               type for one aircraft while shedding. Types not listed are
+                               never shed.
+        type_names (dict): Message type -> readable name used in logs and shed records.
+        backlog_high (int): Unread feed bytes that start shedding.
+        backlog_low (int): Unread feed bytes below which shedding may stop.
+        queue_high (int): Broker queue depth that starts shedding.
+        queue_low (int): Broker queue depth below which shedding may stop.
+        sink: Optional object with a `write_row(row)` method receiving SHED_HEADERS rows.
+    """
+
+    def __init__(self, shed_intervals, type_names=None, backlog_high=64 * 1024, backlog_low=8 * 1024,
+                 queue_high=10000, queue_low=1000, sink=None):
+        self.shed_intervals = shed_intervals
+        self.type_names = type_names or {}
+        self.backlog_high = backlog_high
+        self.backlog_low = backlog_low
+        self.queue_high = queue_high
+        self.queue_low = queue_low
+        self.sink = sink
+
+        self.shedding = False
+        self.queue_depths = {}
+        self.shed_counts = Counter()
+        self.total_shed = 0
+        self._last_kept = {}
+        self._episode_start = None
+
+    def observe(self, backlog, queue_depths=None):
+        """
+        Updates the shedding state from the current pressure readings.
+
+        Args:
+            backlog (int): Bytes received from the feed that the producer has not read yet.
+            queue_depths (dict): Queue name -> ready message count, or None to reuse the
+                                 last reading.
+        """
+        if queue_depths is not None:
+            self.queue_depths = queue_depths
+        deepest_queue = max(self.queue_depths.values(), default=0)
+
+        if not self.shedding:
+            if backlog >= self.backlog_high or deepest_queue >= self.queue_high:
+                self.shedding = True
+                if self._episode_start is None:
+                    self._episode_start = time.time()
+                logger.warning(f"Overload (feed backlog {backlog} bytes, deepest queue {deepest_queue}): "
+                               f"downsampling {', '.join(self._name(message_type) for message_type in self.shed_intervals)}")
+            elif self.shed_counts:
+                # Messages dropped from a full buffer outside an episode
+                self._close_episode()
+
+        elif backlog <= self.backlog_low and deepest_queue <= self.queue_low:
+            self.shedding = False
+            self._last_kept.clear()
+            self._close_episode()
+
+    def admit(self, message_type, aircraft_icao_id, now=None):
+        """
+        Returns True if the message should be sent, recording it as shed otherwise.
+        """
+        interval = self.shed_intervals.get(message_type)
+        if not self.shedding or interval is None:
+            return True
+
+        now = time.time() if now is None else now
+        key = (message_type, aircraft_icao_id)
+        last_kept = self._last_kept.get(key)
+        if last_kept is not None and now - last_kept < interval:
+            self.record_shed(message_type, aircraft_icao_id)
+            return False
+        self._last_kept[key] = now
+        return True
+
+    def is_sheddable(self, message_type):
+        return message_type in self.shed_intervals
+
+    def record_shed(self, message_type, aircraft_icao_id):
+        """
+        Counts one message as shed.
+        """
+        if self._episode_start is None:
+            self._episode_start = time.time()
+        self.shed_counts[(message_type, aircraft_icao_id)] += 1
+        self.total_shed += 1
+
+    def _name(self, message_type):
+        return self.type_names.get(message_type, str(message_type))
+
+    def _close_episode(self):
+        episode_start = self._episode_start
+        episode_end = time.time()
+        self._episode_start = None
+        shed_counts = self.shed_counts
+        self.shed_counts = Counter()
+
+        per_type = Counter()
+        aircraft = Counter()
+        for (message_type, _), count in shed_counts.items():
+            per_type[message_type] += count
+            aircraft[message_type] += 1
+        summary = ', '.join(f"{self._name(message_type)}: {count} from {aircraft[message_type]} aircraft"
+                            for message_type, count in sorted(per_type.items()))
+        logger.warning(f"Load shedding ended after {episode_end - episode_start:.1f}s, "
+                       f"shed {sum(per_type.values())} messages ({summary or 'none'})")
+
+        if self.sink is not None:
+            start_text = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(episode_start))
+            end_text = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(episode_end))
+            for (message_type, aircraft_icao_id), count in sorted(shed_counts.items()):
+                self.sink.write_row([start_text, end_text, self._name(message_type), aircraft_icao_id, count])
@@ -0,0 +1,100 @@
+'''
+Date: October 19, 2026
+
+Local benchmark client for aircraft_state_api.py. Starts the API in-process on a table
+filled with synthetic aircraft, keeps feeding it updates the way the producer would, and
+hammers it from several keep-alive client threads while reporting requests per second.
+
+Usage:
+    python state_api_benchmark.py [clients] [seconds]
+'''
+import sys
+import time
+import random
+import threading
+import http.client
+
+from aircraft_state_api import AircraftStateTable, start_state_api
+
+AIRCRAFT_COUNT = 500
+COMPANIES = ['AAL', 'DAL', 'UAL', 'SWA', 'JBU', 'FDX', 'UPS']
+
+
+def synthetic_message(aircraft_icao_id):
+    """
+    Returns a random decoded message for the given aircraft.
+    """
+    date = time.strftime('%Y/%m/%d')
+    timestamp = time.strftime('%H:%M:%S.000')
+    kind = random.choice(['MSG3', 'MSG4', 'MSG6', 'MSG1'])
+    if kind == 'MSG3':
+        values = [str(random.randint(1000, 40000)),
+                  f"{random.uniform(25, 45):.5f}", f"{random.uniform(-120, -70):.5f}"]
+    elif kind == 'MSG4':
+        values = [str(random.randint(120, 520)), str(random.randint(0, 359))]
+    elif kind == 'MSG6':
+        values = [f"{random.randint(0, 7777):04d}"]
+    else:
+        values = [random.choice(COMPANIES)]
+    return [kind, aircraft_icao_id, date, timestamp] + values
+
+
+def feed_table(table, icao_ids, stop):
+    while not stop.is_set():
+        table.update(synthetic_message(random.choice(icao_ids)))
+        time.sleep(0.0005)
+
+
+def run_client(port, paths, deadline, counts, index):
+    conn = http.client.HTTPConnection('127.0.0.1', port)
+    done = 0
+    while time.time() < deadline:
+        conn.request('GET', random.choice(paths))
+        response = conn.getresponse()
+        response.read()
+        done += 1
+    conn.close()
+    counts[index] = done
+
+
+def main(clients=8, seconds=10):
+    table = AircraftStateTable()
+    icao_ids = [f"{n:06X}" for n in random.sample(range(0xA00000, 0xAFFFFF), AIRCRAFT_COUNT)]
+    for aircraft_icao_id in icao_ids:
+        for _ in range(4):
+            table.update(synthetic_message(aircraft_icao_id))
+    table.build_snapshot()
+
+    server = start_state_api(table, port=0)
+    port = server.server_address[1]
+
+    stop = threading.Event()
+    feeder = threading.Thread(target=feed_table, args=(table, icao_ids, stop))
+    feeder.daemon = True
+    feeder.start()
+
+    paths = ([f"/aircraft/{aircraft_icao_id}" for aircraft_icao_id in icao_ids[:50]]
+             + ['/aircraft', '/aircraft?company=AAL', '/aircraft?min_altitude=30000', '/health'])
+
+    counts = [0] * clients
+    deadline = time.time() + seconds
+    threads = [threading.Thread(target=run_client, args=(port, paths, deadline, counts, i))
+               for i in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stop.set()
+    server.shutdown()
+
+    total = sum(counts)
+    print(f"{total} requests in {seconds}s from {clients} clients: {total / seconds:.0f} requests/s")
+
+
+if __name__ == '__main__':
+    try:
+        args = [int(arg) for arg in sys.argv[1:3]]
+        main(*args)
+    except KeyboardInterrupt:
+        print("\nExiting peacefully...")
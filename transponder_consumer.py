@@ -4,19 +4,14 @@ Date: Septmber 26, 2023
 '''
 import pika
 import time
-import csv
 import smtplib
+import threading
 from email.mime.text import MIMEText
 from collections import deque
-import configparser
+from csv_sink import sink_from_config
+from consumer_common import config, rabbit_host, rabbit_port, decode_message, start_dedicated_consumer
 
-# Load the configuration parameters from a file
-config = configparser.ConfigParser()
-config.read('config.ini')
-
-# Get the configuration parameters
-rabbit_host = config['RabbitMQ']['rabbit_host']
-rabbit_port = int(config['RabbitMQ']['rabbit_port'])
+# Get the email configuration parameters
 smtp_port = config['Gmail']['smtp_port']
 smtp_password = config['Gmail']['smtp_password']
 sender = config['Gmail']['sender']
@@ -28,15 +23,29 @@ recipients = config['Gmail']['recipients']
 transponder_queue = 'transponder_queue'
 TRANSPODER_DEQUE_MAX_LENGTH = 100000
 
+# Emergency squawks published immediately by the producer, ahead of the buffered traffic
+emergency_queue = 'emergency_queue'
+
+# Transponder codes that trigger an alert (7500, 7600 and 7700); 0621 is for testing the alert
+ALERT_TRANSPONDER_CODES = ['7600', '7500', '7700', '0621']
+
 # Create a deque to store transponder readings
 transponder_deque = deque(maxlen=TRANSPODER_DEQUE_MAX_LENGTH)
 
-# CSV file configuration
-csv_filename = 'transponder_messages.csv'
+# CSV headers
+csv_headers = ['type_msg', 'aircraft_icao_id', 'first_date', 'first_timestamp', 'transponder']
+
+# Rotating CSV output (see csv_sink.py)
+csv_sink = sink_from_config(config, 'transponder_messages', csv_headers)
 
 # Create a set to store unique message keys (aircraft ICAO ID and transponder code)
 unique_message_keys = set()
 
+# Message keys already alerted on, shared by the emergency and transponder paths so an
+# emergency is only reported once
+alerted_message_keys = set()
+alerted_message_keys_lock = threading.Lock()
+
 # Email configuration
 smtp_server = 'smtp.gmail.com'
 smtp_port = smtp_port
@@ -73,28 +82,75 @@ def send_email_alert(subject, message):
     except Exception as e:
         print(f"Error sending email: {str(e)}")
 
-def show_transponder_alert(timestamp, transponder):
+def show_transponder_alert(timestamp, transponder, aircraft_icao_id=None):
     """Prints a transponder alert message to the console and sends an email alert.
 
+    The email is sent from a background thread so a slow SMTP server never delays the
+    next alert.
+
     Args:
         timestamp: The timestamp of the transponder alert.
         transponder: The transponder code that triggered the alert.
+        aircraft_icao_id: The ICAO ID of the aircraft squawking the code, if known.
 
     Returns:
         None.
     """
-    print(f"Transponder Alert at: {timestamp}, Transponder: {transponder}")
-    send_email_alert(f"Transponder Alert: {transponder} received", f"Timestamp: {timestamp}, Transponder: {transponder}")
+    aircraft = f", Aircraft ICAO ID: {aircraft_icao_id}" if aircraft_icao_id else ""
+    print(f"Transponder Alert at: {timestamp}, Transponder: {transponder}{aircraft}")
+    email_thread = threading.Thread(target=send_email_alert,
+                                    args=(f"Transponder Alert: {transponder} received",
+                                          f"Timestamp: {timestamp}, Transponder: {transponder}{aircraft}"))
+    email_thread.daemon = True
+    email_thread.start()
+
+def raise_transponder_alert(aircraft_icao_id, transponder):
+    """Alerts on a transponder code unless it was already reported for this aircraft.
+
+    Args:
+        aircraft_icao_id: The ICAO ID of the aircraft.
+        transponder: The transponder code received.
+
+    Returns:
+        None.
+    """
+    message_key = f"{aircraft_icao_id}-{transponder}"
+    with alerted_message_keys_lock:
+        if message_key in alerted_message_keys:
+            return
+        alerted_message_keys.add(message_key)
+    current_time = time.strftime('%Y-%m-%d %H:%M:%S')
+    show_transponder_alert(current_time, transponder, aircraft_icao_id)
+
+def emergency_callback(ch, method, properties, body):
+    """
+    Callback function for the emergency queue. Alerts straight away; the same message also
+    arrives on the transponder queue, where it is persisted.
+
+    Args:
+        ch (pika.Channel): The channel where the message was received.
+        method (pika.spec.Basic.Deliver): The method used to deliver the message.
+        properties (pika.spec.BasicProperties): The properties of the message.
+        body (bytes): The message body as bytes.
+
+    Returns:
+        None.
+    """
+    try:
+        fields = decode_message(body)
+        # Ignore heartbeat messages
+        if fields is None:
+            return
+        raise_transponder_alert(fields[1], fields[4].strip())
+    except Exception as e:
+        print(f"Error processing emergency message: {str(e)}")
 
 def transponder_callback(ch, method, properties, body):
     try:
-        # Decode the message from bytes to a string
-        body_str = body.decode('utf-8')
-        # Check if the message is a heartbeat message
-        if body_str == "Heartbeat Message":
-            # Ignore heartbeat messages
+        fields = decode_message(body)
+        # Ignore heartbeat messages
+        if fields is None:
             return
-        fields = body_str.split(',')
 
         # Extract relevant information
         type_msg = fields[0]
@@ -103,6 +159,11 @@ def transponder_callback(ch, method, properties, body):
         first_timestamp = fields[3]
         transponder = fields[4]
 
+        # Alert before any persistence; emergencies have usually been reported already by
+        # emergency_callback
+        if transponder in ALERT_TRANSPONDER_CODES:
+            raise_transponder_alert(aircraft_icao_id, transponder)
+
         # Create a unique message key using aircraft ICAO ID and transponder code
         message_key = f"{aircraft_icao_id}-{transponder}"
 
@@ -110,43 +171,25 @@ def transponder_callback(ch, method, properties, body):
         if message_key not in unique_message_keys:
             unique_message_keys.add(message_key)  # Add the message key to the set of unique keys
 
-            # Add CSV headers
-            csv_headers = ['type_msg', 'aircraft_icao_id', 'first_date', 'first_timestamp', 'transponder']
-
             # Add the transponder reading to the deque
             transponder_deque.append(transponder)
 
             print(f"Received data for aircraft ICAO ID: {aircraft_icao_id} / {transponder}")
 
-            # Write the message to the CSV file
-            csv_exists = False
-            try:
-                with open(csv_filename, 'r') as csv_file:
-                    csv_exists = True
-            except FileNotFoundError:
-                pass
-
-            with open(csv_filename, mode='a', newline='') as csv_file:
-                csv_writer = csv.writer(csv_file)
-
-                # Write headers if the file is newly created
-                if not csv_exists:
-                    csv_writer.writerow(csv_headers)
-
-                csv_writer.writerow([type_msg, aircraft_icao_id, first_date, first_timestamp, transponder])
+            # Append the message to the current output segment
+            csv_sink.write_row([type_msg, aircraft_icao_id, first_date, first_timestamp, transponder])
 
             print(f"Received transponder code: {transponder}")
-
-            # Check if the transponder value is one of 7600, 7500, or 7700, and trigger the alert
-            # added 0621 for testing the alert
-            if transponder in ['7600', '7500', '7700','0621']:
-                current_time = time.strftime('%Y-%m-%d %H:%M:%S')
-                show_transponder_alert(current_time, transponder)
     except ValueError:
         print("Invalid transponder value in message body.")
     except Exception as e:
         print(f"Error processing message: {str(e)}")
+
 def main():
+    # The emergency queue gets a connection of its own, so emergency messages are never stuck
+    # behind deliveries from a backed up transponder queue; it reconnects if the connection drops
+    start_dedicated_consumer(emergency_queue, emergency_callback)
+
     connection = pika.BlockingConnection(pika.ConnectionParameters(host=rabbit_host, port=rabbit_port,heartbeat=600))
     channel = connection.channel()
 